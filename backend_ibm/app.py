@@ -3,9 +3,10 @@ Flask backend for Relativity FAQ Chatbot.
 Handles RESTful API routes for chatbot interactions and contact collection.
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
+import json
 import logging
 from dotenv import load_dotenv
 import sys
@@ -14,10 +15,12 @@ import sys
 sys.path.append('.')
 
 from rag_ibm import RelativityRAGPipelineIBM
-from sheets import GoogleSheetsLogger
+from sheets import get_logger as get_sheets_logger
 
-# Load environment variables
-load_dotenv()
+# Load environment variables (sheets.py has already done so when imported first)
+if os.getenv("DOTENV_LOADED") != "1":
+    load_dotenv()
+    os.environ["DOTENV_LOADED"] = "1"
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +33,12 @@ app = Flask(__name__)
 ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "*").split(",")
 CORS(app, resources={r"/*": {"origins": ALLOWED_ORIGINS}})
 
+# Maximum number of questions accepted by /chatbot/batch
+MAX_BATCH_QUESTIONS = int(os.getenv("CHATBOT_BATCH_MAX", "8"))
+
+# Maximum number of questions accepted by /warmup
+MAX_WARMUP_QUESTIONS = 256
+
 # Global variables for components
 rag_pipeline = None
 sheets_logger = None
@@ -40,25 +49,25 @@ def initialize_components():
     
     try:
         # Initialize RAG pipeline
-        rag_pipeline = RelativityRAGPipelineIBM()
+        pipeline = RelativityRAGPipelineIBM(retrieval_profile=os.getenv("RETRIEVAL_PROFILE") or None)
         
         # Check if vector store exists
-        if not rag_pipeline.load_existing_vector_store():
+        if not pipeline.load_existing_vector_store():
             logger.warning("Vector store not found. Please run data ingestion first.")
             return False
         
         # Create QA chain
-        rag_pipeline.create_qa_chain()
+        pipeline.create_qa_chain()
         
-        # Initialize Google Sheets logger
-        sheets_logger = GoogleSheetsLogger()
-        if not sheets_logger.authenticate():
-            logger.error("Failed to authenticate with Google Sheets")
+        # Google Sheets logger is authenticated and set up once per process
+        try:
+            sheets_logger = get_sheets_logger()
+        except Exception as e:
+            logger.error(f"Failed to initialize Google Sheets logger: {e}")
             return False
         
-        # Setup sheet
-        sheets_logger.setup_sheet("Contact Submissions")
-        
+        # Only publish a fully initialized pipeline, so /health reflects readiness
+        rag_pipeline = pipeline
         logger.info("Components initialized successfully")
         return True
         
@@ -68,12 +77,23 @@ def initialize_components():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
+    """Health check endpoint; returns 503 until the RAG pipeline is ready."""
+    healthy = rag_pipeline is not None
     return jsonify({
-        "status": "healthy",
-        "rag_pipeline": rag_pipeline is not None,
-        "sheets_logger": sheets_logger is not None
-    })
+        "status": "healthy" if healthy else "unhealthy",
+        "rag_pipeline": healthy,
+        "sheets_logger": sheets_logger is not None,
+        "query_cache": rag_pipeline.get_cache_stats() if rag_pipeline else None
+    }), 200 if healthy else 503
+
+def format_chatbot_response(result: dict) -> dict:
+    """Shape a RAG pipeline result into the /chatbot response body."""
+    return {
+        "answer": result.get("answer", "No se pudo generar una respuesta."),
+        "citations": result.get("citations", []),
+        "has_sufficient_info": result.get("has_sufficient_info", False),
+        "needs_contact": result.get("needs_contact", True)
+    }
 
 @app.route('/chatbot', methods=['POST'])
 def chatbot():
@@ -87,6 +107,12 @@ def chatbot():
             }), 400
         
         question = data['question']
+        max_answer_chars = data.get('max_answer_chars')
+        
+        if max_answer_chars is not None and (type(max_answer_chars) is not int or max_answer_chars <= 0):
+            return jsonify({
+                "error": "max_answer_chars must be a positive integer"
+            }), 400
         
         if not rag_pipeline:
             return jsonify({
@@ -94,17 +120,9 @@ def chatbot():
             }), 500
         
         # Query the RAG pipeline
-        result = rag_pipeline.query(question)
-        
-        # Use the improved logic from RAG pipeline
-        response = {
-            "answer": result.get("answer", "No se pudo generar una respuesta."),
-            "citations": result.get("citations", []),
-            "has_sufficient_info": result.get("has_sufficient_info", False),
-            "needs_contact": result.get("needs_contact", True)
-        }
+        result = rag_pipeline.query(question, max_answer_chars=max_answer_chars)
         
-        return jsonify(response)
+        return jsonify(format_chatbot_response(result))
         
     except Exception as e:
         logger.error(f"Error in chatbot endpoint: {e}")
@@ -112,6 +130,121 @@ def chatbot():
             "error": "Internal server error"
         }), 500
 
+@app.route('/chatbot/batch', methods=['POST'])
+def chatbot_batch():
+    """Handle several chatbot questions in one request, returning results in the same order."""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('questions'), list) or not data['questions']:
+            return jsonify({
+                "error": "Missing questions list in request body"
+            }), 400
+        
+        questions = data['questions']
+        
+        if len(questions) > MAX_BATCH_QUESTIONS:
+            return jsonify({
+                "error": f"At most {MAX_BATCH_QUESTIONS} questions per batch"
+            }), 400
+        
+        if not all(isinstance(question, str) and question.strip() for question in questions):
+            return jsonify({
+                "error": "Every question must be a non-empty string"
+            }), 400
+        
+        if not rag_pipeline:
+            return jsonify({
+                "error": "RAG pipeline not initialized"
+            }), 500
+        
+        # One embedding pass and index search for the batch; LLM calls run concurrently
+        results = [format_chatbot_response(result) for result in rag_pipeline.query_batch(questions)]
+        
+        return jsonify({"results": results})
+        
+    except Exception as e:
+        logger.error(f"Error in chatbot batch endpoint: {e}")
+        return jsonify({
+            "error": "Internal server error"
+        }), 500
+
+@app.route('/warmup', methods=['POST'])
+def warmup():
+    """Precompute query embeddings for questions that are expected to be asked."""
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('questions'), list):
+            return jsonify({
+                "error": "Missing questions list in request body"
+            }), 400
+        
+        questions = data['questions']
+        
+        if len(questions) > MAX_WARMUP_QUESTIONS:
+            return jsonify({
+                "error": f"At most {MAX_WARMUP_QUESTIONS} questions per warmup"
+            }), 400
+        
+        if not all(isinstance(question, str) and question.strip() for question in questions):
+            return jsonify({
+                "error": "Every question must be a non-empty string"
+            }), 400
+        
+        if not rag_pipeline:
+            return jsonify({
+                "error": "RAG pipeline not initialized"
+            }), 500
+        
+        computed = rag_pipeline.warmup(questions)
+        
+        return jsonify({
+            "warmed": len(questions),
+            "computed": computed
+        })
+        
+    except Exception as e:
+        logger.error(f"Error in warmup endpoint: {e}")
+        return jsonify({
+            "error": "Internal server error"
+        }), 500
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.route('/chatbot/stream', methods=['POST'])
+def chatbot_stream():
+    """Handle chatbot questions, streaming the answer as Server-Sent Events."""
+    data = request.get_json(silent=True)
+    
+    if not data or 'question' not in data:
+        return jsonify({
+            "error": "Missing question in request body"
+        }), 400
+    
+    question = data['question']
+    
+    if not rag_pipeline:
+        return jsonify({
+            "error": "RAG pipeline not initialized"
+        }), 500
+    
+    def generate():
+        for event, payload in rag_pipeline.stream_query(question):
+            yield format_sse(event, payload)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Disable proxy buffering so tokens reach the client as they are generated
+            "X-Accel-Buffering": "no"
+        }
+    )
+
 @app.route('/collect_contact', methods=['POST'])
 def collect_contact():
     """Handle contact information collection."""
@@ -145,7 +278,7 @@ def collect_contact():
         
         if not validation["is_valid"]:
             return jsonify({
-                "error": validation["error"],
+                "error": "; ".join(validation["errors"]),
                 "success": False
             }), 400
         
@@ -209,7 +342,7 @@ def validate_contact():
         
         return jsonify({
             "is_valid": validation["is_valid"],
-            "error": validation.get("error", ""),
+            "error": "; ".join(validation["errors"]),
             "parsed_data": {
                 "name": name,
                 "email": email,
@@ -0,0 +1,238 @@
+"""
+Shared embedding model for ingestion and the RAG pipeline.
+Loads the sentence-transformers model once per process and memoizes query embeddings.
+Optionally runs an INT8-quantized ONNX export of the model through ONNX Runtime.
+"""
+
+import os
+import sys
+import functools
+import hashlib
+import queue
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+import numpy as np
+import torch
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings from an ONNX Runtime session (mean pooling + L2 normalization)."""
+    
+    def __init__(self, model_dir: str, batch_size: int = 128, max_length: int = 128):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"),
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+        self.max_length = max_length
+    
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts in batches, matching the sentence-transformers pooling."""
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            encoded = self.tokenizer(
+                texts[start:start + self.batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np"
+            )
+            attention_mask = encoded["attention_mask"].astype(np.int64)
+            (hidden,) = self.session.run(
+                ["last_hidden_state"],
+                {"input_ids": encoded["input_ids"].astype(np.int64), "attention_mask": attention_mask}
+            )
+            
+            # Mean pooling over non-padding tokens, then L2-normalize (inner product = cosine)
+            mask = attention_mask[..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+            vectors.extend(pooled.tolist())
+        
+        return vectors
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents."""
+        return self._embed(list(texts))
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query."""
+        return self._embed([text])[0]
+
+def export_int8_onnx(output_dir: str, model_name: str = EMBEDDING_MODEL):
+    """Export the embedding model to ONNX and quantize its weights to INT8."""
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name, return_dict=False).eval()
+    
+    dummy = tokenizer(["Relativity release notes"], return_tensors="pt")
+    fp32_path = os.path.join(output_dir, "model_fp32.onnx")
+    
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state", "pooler_output"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "last_hidden_state": {0: "batch", 1: "sequence"},
+                "pooler_output": {0: "batch"}
+            },
+            opset_version=14
+        )
+    
+    quantize_dynamic(fp32_path, os.path.join(output_dir, "model.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(output_dir)
+    logger.info(f"Exported INT8 ONNX embedding model to {output_dir}")
+
+class MicroBatchEmbeddings(Embeddings):
+    """Coalesce concurrent embed_query calls into batched forward passes.
+    
+    A single worker takes whatever queries are waiting (up to max_batch, optionally waiting
+    max_wait seconds for more) and embeds them in one embed_documents call, so request threads
+    that arrive together share one tokenizer + model pass.
+    """
+    
+    def __init__(self, embeddings: Embeddings, max_batch: int = 8, max_wait: float = 0.0):
+        self.embeddings = embeddings
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        threading.Thread(target=self._worker, name="embedding-batcher", daemon=True).start()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents directly (ingestion already batches)."""
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query as part of the next batch."""
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+    
+    def _worker(self):
+        """Drain queued queries into batches and resolve their futures."""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            try:
+                embeddings = self.embeddings.embed_documents([text for text, _ in batch])
+                for (_, future), embedding in zip(batch, embeddings):
+                    future.set_result(embedding)
+            except Exception as e:
+                logger.error(f"Error embedding query batch: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+
+class CachedQueryEmbeddings(Embeddings):
+    """Embeddings wrapper with an LRU+TTL cache of query embeddings keyed by SHA-256 of the text."""
+    
+    def __init__(self, embeddings: Embeddings, max_entries: int = 1024, ttl_seconds: float = 3600.0):
+        self.embeddings = embeddings
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._cache: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Embed documents (not cached; used for ingestion)."""
+        return self.embeddings.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        """Embed a query, reusing the cached embedding for repeated texts."""
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                return entry[1]
+        
+        embedding = self.embeddings.embed_query(text)
+        self._store([(key, embedding)])
+        return embedding
+    
+    def warmup(self, texts: List[str]) -> int:
+        """Precompute query embeddings for texts not already cached, in one batch; returns how many."""
+        keys = {hashlib.sha256(text.encode("utf-8")).hexdigest(): text for text in texts}
+        
+        with self._lock:
+            now = time.monotonic()
+            missing = [
+                (key, text) for key, text in keys.items()
+                if not (key in self._cache and self._cache[key][0] > now)
+            ]
+        
+        if missing:
+            embeddings = self.embeddings.embed_documents([text for _, text in missing])
+            self._store([(key, embedding) for (key, _), embedding in zip(missing, embeddings)])
+        return len(missing)
+    
+    def _store(self, entries: List[Tuple[str, List[float]]]):
+        """Insert embeddings into the cache, evicting the least recently used ones."""
+        with self._lock:
+            expiry = time.monotonic() + self.ttl_seconds
+            for key, embedding in entries:
+                self._cache[key] = (expiry, embedding)
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+
+def get_embedder(model_name: str = EMBEDDING_MODEL) -> CachedQueryEmbeddings:
+    """Load the embedding model once per process (normalized, batched, on GPU when available).
+    
+    When EMBEDDINGS_ONNX_DIR is set, the INT8 ONNX export in that directory is used instead.
+    The same model must be used to build the index and to query it.
+    """
+    # Read at call time so a value from .env, loaded after this module is imported, is honored
+    return _load(model_name, os.getenv("EMBEDDINGS_ONNX_DIR") or None)
+
+@functools.lru_cache(maxsize=None)
+def _load(model_name: str, onnx_dir: Optional[str]) -> CachedQueryEmbeddings:
+    """Build the embedder; arguments are always positional and resolved so each model is cached once."""
+    if onnx_dir:
+        logger.info(f"Using INT8 ONNX embedding model from {onnx_dir}")
+        return CachedQueryEmbeddings(MicroBatchEmbeddings(OnnxEmbeddings(onnx_dir)))
+    
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={"device": "cuda" if torch.cuda.is_available() else "cpu"},
+        encode_kwargs={"normalize_embeddings": True, "batch_size": 128}
+    )
+    return CachedQueryEmbeddings(MicroBatchEmbeddings(embeddings))
+
+if __name__ == "__main__":
+    # Usage: python embedder.py [output_dir]
+    logging.basicConfig(level=logging.INFO)
+    export_int8_onnx(sys.argv[1] if len(sys.argv) > 1 else "minilm_int8")
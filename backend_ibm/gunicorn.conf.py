@@ -0,0 +1,25 @@
+"""
+Gunicorn configuration for the Relativity FAQ Chatbot backend.
+Chatbot requests spend most of their time waiting on watsonx.ai, so each worker
+runs a pool of threads that keeps serving other requests while LLM calls are in flight.
+"""
+
+import os
+
+bind = f"{os.getenv('CHATBOT_HOST', '0.0.0.0')}:{os.getenv('CHATBOT_PORT', '8080')}"
+worker_class = "gthread"
+workers = int(os.getenv("GUNICORN_WORKERS", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+
+# Exit code gunicorn treats as a worker boot failure: the arbiter shuts down instead of respawning
+WORKER_BOOT_ERROR = 4
+
+def post_worker_init(worker):
+    """Initialize the RAG pipeline and Google Sheets logger in each worker."""
+    import sys
+    from app import initialize_components
+    
+    if not initialize_components():
+        worker.log.error("Failed to initialize components. Exiting.")
+        sys.exit(WORKER_BOOT_ERROR)
@@ -0,0 +1,108 @@
+"""
+Shared ingestion pipeline for Relativity release notes.
+Loads crawled blocks, splits them into chunks, embeds them and persists a FAISS index.
+Used by both ingest.py and the RAG pipeline so every indexing change lives in one place.
+"""
+
+import functools
+import logging
+from typing import List, Dict, Any, Iterator
+import orjson
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TextSplitter
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+INSERT_BATCH_SIZE = 2048
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 150
+SEPARATORS = ("\n\n", "\n", ". ", " ", "")
+
+@functools.lru_cache(maxsize=None)
+def get_splitter(chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> TextSplitter:
+    """Return the shared chunking configuration used for every index build."""
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=list(SEPARATORS)
+    )
+
+def iter_blocks(json_path: str) -> Iterator[Dict[str, Any]]:
+    """Stream content blocks from a JSONL crawl file (legacy JSON arrays are also accepted)."""
+    with open(json_path, "rb") as f:
+        if f.read(1) == b"[":
+            f.seek(0)
+            yield from orjson.loads(f.read())
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
+
+def load_documents(json_path: str) -> List[Document]:
+    """Convert crawled blocks into LangChain Documents with rich metadata."""
+    documents = []
+    for block in iter_blocks(json_path):
+        # Combine content parts
+        content_parts = [
+            block.get("title", ""),
+            block.get("heading", ""),
+            block.get("content", "")
+        ]
+        content = "\n".join([part for part in content_parts if part.strip()])
+
+        if content.strip():
+            documents.append(Document(
+                page_content=content,
+                metadata={
+                    "title": block.get("title", ""),
+                    "heading": block.get("heading", ""),
+                    "url": block.get("url", ""),
+                    "source": "relativity_release_notes"
+                }
+            ))
+
+    logger.info(f"Loaded {len(documents)} documents from {json_path}")
+    return documents
+
+def index_documents(documents: List[Document], persist_dir: str, embeddings: Embeddings,
+                    splitter: TextSplitter, insert_batch_size: int = INSERT_BATCH_SIZE) -> FAISS:
+    """Split, embed and insert documents into a FAISS index, writing it to disk once."""
+    # Split all documents in one pass
+    split_docs = splitter.split_documents(documents)
+
+    # Embed and insert chunks in slabs
+    vector_store = None
+    for start in range(0, len(split_docs), insert_batch_size):
+        batch = split_docs[start:start + insert_batch_size]
+        texts = [doc.page_content for doc in batch]
+        text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+        metadatas = [doc.metadata for doc in batch]
+
+        if vector_store is None:
+            # Create vector store (embeddings are normalized, so inner product = cosine)
+            vector_store = FAISS.from_embeddings(
+                text_embeddings,
+                embeddings,
+                metadatas=metadatas,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
+            )
+        else:
+            vector_store.add_embeddings(text_embeddings, metadatas=metadatas)
+
+    if vector_store is None:
+        raise ValueError("No documents to index")
+
+    vector_store.save_local(persist_dir)
+    logger.info(f"Indexed {len(split_docs)} chunks into {persist_dir}")
+    return vector_store
+
+def build_index(json_path: str, persist_dir: str, embeddings: Embeddings, splitter: TextSplitter,
+                insert_batch_size: int = INSERT_BATCH_SIZE) -> FAISS:
+    """Build a FAISS index from a crawl file."""
+    documents = load_documents(json_path)
+    return index_documents(documents, persist_dir, embeddings, splitter, insert_batch_size)
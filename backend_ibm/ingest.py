@@ -3,119 +3,92 @@ Data ingestion module for Relativity release notes.
 Crawls the official release notes page and extracts structured content.
 """
 
+import asyncio
 import httpx
-import time
 import re
 import urllib.parse as up
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from typing import List, Dict, Any
 import logging
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_core.documents import Document
-import json, os
+import orjson
+import os
 import shutil
+from dotenv import load_dotenv
 
-DB_DIR = "./chroma_db"
-JSON_PATH = "relativity_releases.json"
+from embedder import get_embedder
+from indexing import INSERT_BATCH_SIZE, build_index, get_splitter
 
-def build_chroma(json_path=JSON_PATH, db_dir=DB_DIR):
-    """Build Chroma vector store with improved embeddings and chunking."""
+DB_DIR = "./faiss_index"
+JSON_PATH = "relativity_releases.jsonl"
+
+# Load environment variables (EMBEDDINGS_ONNX_DIR must match the service's setting)
+if os.getenv("DOTENV_LOADED") != "1":
+    load_dotenv()
+    os.environ["DOTENV_LOADED"] = "1"
+
+# Configure logging (LOGLEVEL=WARNING keeps only warnings and errors)
+logging.basicConfig(level=os.getenv("LOGLEVEL", "INFO").upper())
+logger = logging.getLogger(__name__)
+
+def build_faiss_index(json_path=JSON_PATH, db_dir=DB_DIR):
+    """Build FAISS vector store with improved embeddings and chunking."""
     
     # Remove existing DB to recreate with new settings
     if os.path.exists(db_dir):
         shutil.rmtree(db_dir)
-        print(f"🗑️ Removed existing vector store: {db_dir}")
-    
-    with open(json_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    # Create documents with rich metadata
-    documents = []
-    for block in data:
-        # Combine content parts
-        content_parts = [
-            block.get("title", ""),
-            block.get("heading", ""),
-            block.get("content", "")
-        ]
-        content = "\n".join([part for part in content_parts if part.strip()])
-        
-        if content.strip():
-            # Create document with metadata
-            doc = Document(
-                page_content=content,
-                metadata={
-                    "title": block.get("title", ""),
-                    "heading": block.get("heading", ""),
-                    "url": block.get("url", ""),
-                    "source": "relativity_release_notes"
-                }
-            )
-            documents.append(doc)
-
-    # Improved text splitting
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=150,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""]
-    )
+        logger.info(f"Removed existing vector store: {db_dir}")
     
-    # Split documents
-    split_docs = []
-    for doc in documents:
-        splits = splitter.split_documents([doc])
-        split_docs.extend(splits)
-
-    # Use multilingual embeddings with normalization
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
-        encode_kwargs={"normalize_embeddings": True}
-    )
-    
-    # Create vector store
-    vs = Chroma.from_documents(
-        split_docs, 
-        embeddings, 
-        persist_directory=db_dir
-    )
-    vs.persist()
+    # Load, split, embed and persist through the shared indexing pipeline
+    vs = build_index(json_path, db_dir, get_embedder(), get_splitter(), INSERT_BATCH_SIZE)
     
-    print(f"✅ Vector store creado en: {db_dir}")
-    print(f"📊 Documentos indexados: {len(split_docs)}")
+    logger.info(f"Vector store created in {db_dir} with {vs.index.ntotal} chunks")
     return vs
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
-
 # Base URL for Relativity release notes
 BASE_URL = "https://help.relativity.com/RelativityOne/Content/What_s_New/Release_notes.htm"
 
+# Only parse the parts of each page we actually read
+LINK_STRAINER = SoupStrainer("a", href=True)
+CONTENT_STRAINER = SoupStrainer(["title", "body"])
+
+HEADING_TAGS = ["h1", "h2", "h3", "h4"]
+CONTENT_TAGS = ["p", "ul", "ol", "table", "div"]
+
 class RelativityReleaseNotesCrawler:
     """Crawler for Relativity release notes and related pages."""
     
-    def __init__(self, base_url: str = BASE_URL, delay: float = 0.5):
+    def __init__(self, base_url: str = BASE_URL, delay: float = 0.5, max_concurrency: int = 8):
         self.base_url = base_url
         self.delay = delay
-        self.session = httpx.Client(timeout=30.0)
+        self.max_concurrency = max_concurrency
+        self.session = httpx.AsyncClient(
+            timeout=30.0,
+            http2=True,
+            limits=httpx.Limits(max_connections=16)
+        )
         
-    def fetch_page(self, url: str) -> str:
+    async def fetch_page(self, url: str) -> str:
         """Fetch a single page with error handling."""
         try:
             logger.info(f"Fetching: {url}")
-            response = self.session.get(url)
+            response = await self.session.get(url)
             response.raise_for_status()
             return response.text
         except Exception as e:
             logger.error(f"Error fetching {url}: {e}")
             return ""
     
+    async def _bounded_fetch(self, semaphore: asyncio.Semaphore, url: str) -> str:
+        """Fetch a page while holding one of the concurrency slots."""
+        async with semaphore:
+            html = await self.fetch_page(url)
+            # Respectful delay before this slot issues its next request
+            await asyncio.sleep(self.delay)
+            return html
+    
     def extract_links(self, html: str, base_url: str) -> List[str]:
         """Extract all relevant links from the page."""
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, "lxml", parse_only=LINK_STRAINER)
         links = []
         
         for anchor in soup.find_all("a", href=True):
@@ -130,7 +103,7 @@ class RelativityReleaseNotesCrawler:
     
     def extract_content_blocks(self, html: str, url: str) -> List[Dict[str, Any]]:
         """Extract structured content blocks from a page."""
-        soup = BeautifulSoup(html, "html.parser")
+        soup = BeautifulSoup(html, "lxml", parse_only=CONTENT_STRAINER)
         
         # Get page title
         title_elem = soup.find("h1") or soup.find("title")
@@ -138,25 +111,27 @@ class RelativityReleaseNotesCrawler:
         
         blocks = []
         
-        # Extract content from headings and their following content
-        for heading in soup.find_all(["h1", "h2", "h3", "h4"]):
-            heading_text = heading.get_text(strip=True)
-            if not heading_text:
-                continue
-                
-            # Collect content following this heading until next heading
-            content_parts = []
-            current = heading.find_next_sibling()
-            
-            while current and current.name not in ["h1", "h2", "h3", "h4"]:
-                if current.name in ["p", "ul", "ol", "table", "div"]:
-                    text = current.get_text(strip=True)
+        # Collect the content following each heading until the next heading.
+        # Each parent's children are scanned once instead of walking siblings per heading.
+        headings = soup.find_all(HEADING_TAGS)
+        parents = {id(heading.parent): heading.parent for heading in headings}
+        sections = {}
+        
+        for parent in parents.values():
+            current = None
+            for child in parent.children:
+                if child.name in HEADING_TAGS:
+                    current = sections.setdefault(id(child), [])
+                elif current is not None and child.name in CONTENT_TAGS:
+                    text = child.get_text(strip=True)
                     if text:
-                        content_parts.append(text)
-                current = current.find_next_sibling()
-            
-            # Create block if we have content
-            if content_parts:
+                        current.append(text)
+        
+        # Create one block per heading with content, in document order
+        for heading in headings:
+            heading_text = heading.get_text(strip=True)
+            content_parts = sections.get(id(heading))
+            if heading_text and content_parts:
                 content = "\n".join(content_parts)
                 blocks.append({
                     "title": page_title,
@@ -180,59 +155,65 @@ class RelativityReleaseNotesCrawler:
         
         return blocks
     
-    def crawl_and_extract(self) -> List[Dict[str, Any]]:
+    async def crawl_and_extract(self) -> List[Dict[str, Any]]:
         """Main method to crawl and extract all content."""
         logger.info("Starting crawl of Relativity release notes...")
         
         # Start with the base page
-        base_html = self.fetch_page(self.base_url)
+        base_html = await self.fetch_page(self.base_url)
         if not base_html:
             logger.error("Failed to fetch base page")
             return []
         
-        # Extract all relevant links
-        all_urls = [self.base_url] + self.extract_links(base_html, self.base_url)
-        logger.info(f"Found {len(all_urls)} pages to crawl")
+        # Extract all relevant links (the base page is already fetched)
+        linked_urls = [url for url in self.extract_links(base_html, self.base_url) if url != self.base_url]
+        logger.info(f"Found {len(linked_urls) + 1} pages to crawl")
+        
+        # Fetch linked pages concurrently, bounded by max_concurrency
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        pages = await asyncio.gather(*[self._bounded_fetch(semaphore, url) for url in linked_urls])
         
         all_blocks = []
         
-        for url in all_urls:
-            html = self.fetch_page(url)
+        for url, html in zip([self.base_url] + linked_urls, [base_html] + pages):
             if html:
                 blocks = self.extract_content_blocks(html, url)
                 all_blocks.extend(blocks)
                 logger.info(f"Extracted {len(blocks)} blocks from {url}")
-            
-            # Respectful delay between requests
-            time.sleep(self.delay)
         
         logger.info(f"Total extracted blocks: {len(all_blocks)}")
         return all_blocks
     
-    def save_to_json(self, blocks: List[Dict[str, Any]], filename: str = "relativity_releases.json"):
-        """Save extracted content to JSON file."""
-        import json
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(blocks, f, indent=2, ensure_ascii=False)
+    def save_to_json(self, blocks: List[Dict[str, Any]], filename: str = JSON_PATH):
+        """Save extracted content to a JSONL file, one block per line."""
+        with open(filename, 'wb') as f:
+            for block in blocks:
+                f.write(orjson.dumps(block) + b"\n")
         logger.info(f"Saved {len(blocks)} blocks to {filename}")
     
-    def close(self):
+    async def close(self):
         """Close the HTTP session."""
-        self.session.close()
+        await self.session.aclose()
 
-def main():
-    """Main function to run the crawler."""
+async def crawl_and_save() -> List[Dict[str, Any]]:
+    """Crawl the release notes and save the extracted blocks."""
     crawler = RelativityReleaseNotesCrawler()
     try:
-        blocks = crawler.crawl_and_extract()
+        blocks = await crawler.crawl_and_extract()
         if blocks:
             crawler.save_to_json(blocks)
-            build_chroma()
-            print(f"Successfully extracted {len(blocks)} content blocks")
-        else:
-            print("No content extracted")
+        return blocks
     finally:
-        crawler.close()
+        await crawler.close()
+
+def main():
+    """Main function to run the crawler."""
+    blocks = asyncio.run(crawl_and_save())
+    if blocks:
+        build_faiss_index()
+        logger.info(f"Successfully extracted {len(blocks)} content blocks")
+    else:
+        logger.warning("No content extracted")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Maximal Marginal Relevance (MMR) re-ranking for retrieved chunks.
+Operates directly on L2-normalized float32 embeddings, so cosine similarity is a dot product.
+"""
+
+import numpy as np
+
+def mmr(query: np.ndarray, candidates: np.ndarray, k: int = 8, lambda_mult: float = 0.5) -> np.ndarray:
+    """Select k candidate indices balancing relevance to the query and diversity.
+
+    ``query`` is a (dim,) vector and ``candidates`` a (n, dim) matrix, both L2-normalized.
+    Returns the selected row indices in selection order.
+    """
+    n = candidates.shape[0]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    
+    sim_query = candidates @ query
+    sim_candidates = candidates @ candidates.T
+    
+    selected = np.empty(k, dtype=np.int64)
+    available = np.ones(n, dtype=bool)
+    
+    # Running max similarity of each candidate to the already selected ones
+    max_sim_selected = np.full(n, -np.inf, dtype=sim_query.dtype)
+    
+    best = int(np.argmax(sim_query))
+    for i in range(k):
+        if i > 0:
+            scores = lambda_mult * sim_query - (1.0 - lambda_mult) * max_sim_selected
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+        
+        selected[i] = best
+        available[best] = False
+        np.maximum(max_sim_selected, sim_candidates[best], out=max_sim_selected)
+    
+    return selected
@@ -4,22 +4,252 @@ Handles vector storage, retrieval, and LLM interactions using IBM watsonx.ai mod
 """
 
 import os
+import re
+import asyncio
 import json
-from typing import List, Dict, Any, Optional
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_community.embeddings import HuggingFaceEmbeddings
+import time
+import random
+import hashlib
+import threading
+import urllib.parse
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
 from langchain.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
 from langchain_core.documents import Document
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import EmbeddingsFilter
+from langchain_core.embeddings import Embeddings
 import logging
-import requests
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import httpx
 import json
+import numpy as np
+
+from embedder import EMBEDDING_MODEL, get_embedder
+from mmr import mmr
+from indexing import INSERT_BATCH_SIZE, get_splitter, index_documents, load_documents
 
 logger = logging.getLogger(__name__)
 
+# Shared HTTP/2 client so IAM and watsonx.ai calls reuse pooled keep-alive connections
+_HTTP = httpx.Client(
+    http2=True,
+    timeout=60.0,
+    limits=httpx.Limits(max_keepalive_connections=32, keepalive_expiry=300)
+)
+
+# Transient watsonx.ai/IAM failures are retried a few times before the question is failed.
+# Only connection failures are retried: a ReadTimeout means the generation may already be
+# running (and billed), so it propagates instead of being re-sent.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+MAX_RETRIES = 3
+MAX_BACKOFF = 4.0
+
+def _post_with_retry(url: str, **kwargs) -> httpx.Response:
+    """POST through the shared client, backing off on connection failures and 429/5xx."""
+    for attempt in range(MAX_RETRIES):
+        try:
+            response = _HTTP.post(url, **kwargs)
+            response.raise_for_status()
+            return response
+        except (*RETRY_EXCEPTIONS, httpx.HTTPStatusError) as e:
+            status = e.response.status_code if isinstance(e, httpx.HTTPStatusError) else None
+            if (status is not None and status not in RETRY_STATUSES) or attempt == MAX_RETRIES - 1:
+                raise
+            delay = min(MAX_BACKOFF, 0.5 * 2 ** attempt) + random.random() * 0.1
+            logger.warning(f"watsonx.ai request failed ({status or type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+# Whole-word Spanish question markers, matched in a single pass
+_ES_RE = re.compile(r"\b(qué|cuáles|cómo|dónde|cuándo|por\s+qué|háblame|dime|explica|describe)\b", re.IGNORECASE)
+
+# Retrieval profiles: size of the candidate pool (fetch_k) scored exactly before thresholding and MMR
+RETRIEVAL_PROFILES = {
+    "fast": 20,
+    "balanced": 40,
+    "recall-max": 100
+}
+
+# Answer prefixes that mean the LLM could not answer from the context
+_INSUFFICIENT_INFO_PREFIXES = (
+    "i don't have enough information",
+    "no tengo suficiente información"
+)
+
+def detect_language(question: str) -> str:
+    """Detect whether a question is in Spanish ("es") or English ("en")."""
+    return "es" if _ES_RE.search(question) else "en"
+
+class QueryCache:
+    """Thread-safe LRU+TTL cache of RAG answers keyed by the normalized question text.
+
+    Checked before the question is embedded, so exact repeats skip embedding, the
+    semantic cache scan, retrieval and the LLM call.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(question: str) -> str:
+        return hashlib.blake2b(question.strip().casefold().encode("utf-8")).hexdigest()
+
+    def get(self, question: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for the question, or None on miss."""
+        key = self._key(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry[1])
+
+    def put(self, question: str, result: Dict[str, Any]):
+        """Store the result for the question, evicting the least recently used entries."""
+        key = self._key(question)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the hit rate."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "size": len(self._entries)
+            }
+
+class SemanticQueryCache:
+    """In-memory cache of RAG answers keyed by normalized query embeddings.
+
+    Embeddings are L2-normalized, so the inner product is the cosine similarity.
+    A lookup hits when a previous question in the same language is at least
+    ``similarity_threshold`` similar, skipping both retrieval and the LLM call.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95, max_entries: int = 1000, ttl_seconds: float = 900.0):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._vectors: Optional[np.ndarray] = None
+        self._languages: List[str] = []
+        self._expiries: List[float] = []
+        self._results: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def _drop_oldest(self, count: int):
+        """Drop the ``count`` oldest entries (entries are stored in insertion order)."""
+        if count <= 0:
+            return
+        self._vectors = self._vectors[count:]
+        del self._languages[:count]
+        del self._expiries[:count]
+        del self._results[:count]
+
+    def _evict_expired(self):
+        """Drop entries whose TTL has elapsed."""
+        now = time.monotonic()
+        expired = 0
+        while expired < len(self._expiries) and self._expiries[expired] <= now:
+            expired += 1
+        self._drop_oldest(expired)
+
+    def lookup(self, embedding: List[float], language: str) -> Optional[Dict[str, Any]]:
+        """Return a cached result for a near-duplicate question, or None on miss."""
+        with self._lock:
+            self._evict_expired()
+            if not self._results:
+                return None
+
+            scores = self._vectors @ np.asarray(embedding, dtype=np.float32)
+            scores[np.asarray(self._languages) != language] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                return None
+
+            logger.info(f"Semantic cache hit (similarity={scores[best]:.3f})")
+            return dict(self._results[best])
+
+    def add(self, embedding: List[float], language: str, result: Dict[str, Any]):
+        """Store the result for a question embedding."""
+        vector = np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+        with self._lock:
+            self._evict_expired()
+            self._drop_oldest(len(self._results) - self.max_entries + 1)
+
+            self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            self._languages.append(language)
+            self._expiries.append(time.monotonic() + self.ttl_seconds)
+            self._results.append(dict(result))
+
+    def clear(self):
+        """Remove all cached entries."""
+        with self._lock:
+            self._drop_oldest(len(self._results))
+
+class FaissRetriever:
+    """MMR retriever over a FAISS inner-product index of normalized chunk embeddings."""
+    
+    def __init__(self, vector_store: FAISS, embeddings: Embeddings, k: int = 8, fetch_k: int = 40,
+                 lambda_mult: float = 0.5, similarity_threshold: float = 0.35):
+        self.vector_store = vector_store
+        self.embeddings = embeddings
+        self.k = k
+        self.fetch_k = fetch_k
+        self.lambda_mult = lambda_mult
+        self.similarity_threshold = similarity_threshold
+    
+    def get_relevant_documents(self, query: str) -> List[Document]:
+        """Embed the query and return the MMR-selected documents."""
+        return self.get_relevant_documents_by_vector(self.embeddings.embed_query(query))
+    
+    def get_relevant_documents_by_vector(self, embedding: List[float]) -> List[Document]:
+        """Return the MMR-selected documents for an already computed query embedding."""
+        return self.get_relevant_documents_by_vectors([embedding])[0]
+    
+    def get_relevant_documents_by_vectors(self, embeddings: List[List[float]]) -> List[List[Document]]:
+        """Return the MMR-selected documents for several query embeddings with one index search."""
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        index = self.vector_store.index
+        
+        # Exact inner-product search over the top fetch_k candidates of every query at once
+        scores, ids = index.search(queries, self.fetch_k)
+        
+        docstore = self.vector_store.docstore
+        index_to_id = self.vector_store.index_to_docstore_id
+        results = []
+        for query, row_scores, row_ids in zip(queries, scores, ids):
+            # Keep only candidates above the similarity threshold (scores are cosine similarities)
+            row_ids = row_ids[(row_ids != -1) & (row_scores > self.similarity_threshold)]
+            if len(row_ids) == 0:
+                results.append([])
+                continue
+            
+            # Re-rank the remaining candidates with MMR using their stored vectors
+            candidates = np.vstack([index.reconstruct(int(i)) for i in row_ids])
+            selected = mmr(query, candidates, k=self.k, lambda_mult=self.lambda_mult)
+            results.append([docstore.search(index_to_id[int(row_ids[i])]) for i in selected])
+        
+        return results
+
 class IBMWatsonXLLM:
     """Wrapper for IBM watsonx.ai LLM integration."""
     
@@ -28,59 +258,80 @@ class IBMWatsonXLLM:
         self.api_key = api_key or os.getenv("IBM_WATSONX_API_KEY")
         self.project_id = project_id or os.getenv("IBM_WATSONX_PROJECT_ID")
         self.base_url = "https://us-south.ml.cloud.ibm.com/ml/v1-beta/generation/text?version=2024-05-29"
+        self.stream_url = "https://us-south.ml.cloud.ibm.com/ml/v1/text/generation_stream?version=2024-05-29"
+        
+        # IAM tokens are valid for ~1 hour; reuse them until shortly before expiry
+        self._token = None
+        self._token_expiry = 0.0
+        self._token_lock = threading.Lock()
         
         if not self.api_key:
             raise ValueError("IBM_WATSONX_API_KEY environment variable is required")
         if not self.project_id:
             raise ValueError("IBM_WATSONX_PROJECT_ID environment variable is required")
+        
+        # The API key is fixed for the process, so the IAM request is encoded once
+        self._iam_url = "https://iam.cloud.ibm.com/identity/token"
+        self._iam_body = urllib.parse.urlencode({
+            "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
+            "apikey": self.api_key
+        }).encode()
+        self._iam_headers = {
+            "Content-Type": "application/x-www-form-urlencoded",
+            "Accept": "application/json"
+        }
     
     def _get_iam_token(self) -> str:
-        """Get IAM token from API key."""
-        try:
-            url = "https://iam.cloud.ibm.com/identity/token"
-            headers = {
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Accept": "application/json"
-            }
-            data = {
-                "grant_type": "urn:ibm:params:oauth:grant-type:apikey",
-                "apikey": self.api_key
-            }
-            
-            response = requests.post(url, headers=headers, data=data, timeout=30)
-            response.raise_for_status()
-            
-            token_data = response.json()
-            return token_data.get("access_token")
+        """Get IAM token from API key, reusing the cached token until it expires."""
+        if self._token and time.monotonic() < self._token_expiry:
+            return self._token
+        
+        with self._token_lock:
+            # Another thread may have refreshed the token while we waited
+            if self._token and time.monotonic() < self._token_expiry:
+                return self._token
             
-        except Exception as e:
-            logger.error(f"Error getting IAM token: {e}")
-            raise
+            try:
+                response = _post_with_retry(self._iam_url, headers=self._iam_headers, content=self._iam_body, timeout=30.0)
+                
+                token_data = response.json()
+                self._token = token_data.get("access_token")
+                # Refresh one minute before the token actually expires
+                self._token_expiry = time.monotonic() + token_data.get("expires_in", 3600) - 60
+                return self._token
+                
+            except Exception as e:
+                logger.error(f"Error getting IAM token: {e}")
+                raise
+    
+    def _build_request(self, prompt: str, temperature: float, max_tokens: int, accept: str = "application/json"):
+        """Build the headers and payload for a watsonx.ai generation request."""
+        access_token = self._get_iam_token()
+        
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json",
+            "Accept": accept
+        }
+        
+        payload = {
+            "model_id": self.model_name,
+            "input": prompt,
+            "parameters": {
+                "temperature": temperature,
+                "max_new_tokens": max_tokens
+            },
+            "project_id": self.project_id
+        }
+        
+        return headers, payload
     
     def __call__(self, prompt: str, temperature: float = 0.0, max_tokens: int = 1000) -> str:
         """Generate text using IBM watsonx.ai."""
         try:
-            # Get IAM token
-            access_token = self._get_iam_token()
-            
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json",
-                "Accept": "application/json"
-            }
+            headers, payload = self._build_request(prompt, temperature, max_tokens)
             
-            payload = {
-                "model_id": self.model_name,
-                "input": prompt,
-                "parameters": {
-                    "temperature": temperature,
-                    "max_new_tokens": max_tokens
-                },
-                "project_id": self.project_id
-            }
-            
-            response = requests.post(self.base_url, headers=headers, json=payload, timeout=60)
-            response.raise_for_status()
+            response = _post_with_retry(self.base_url, headers=headers, json=payload)
             
             result = response.json()
             return result.get("results", [{}])[0].get("generated_text", "")
@@ -88,17 +339,47 @@ class IBMWatsonXLLM:
         except Exception as e:
             logger.error(f"Error calling IBM watsonx.ai: {e}")
             raise
+    
+    def stream(self, prompt: str, temperature: float = 0.0, max_tokens: int = 1000) -> Iterator[str]:
+        """Generate text using IBM watsonx.ai, yielding text deltas as they are produced."""
+        try:
+            headers, payload = self._build_request(prompt, temperature, max_tokens, accept="text/event-stream")
+            
+            with _HTTP.stream("POST", self.stream_url, headers=headers, json=payload) as response:
+                response.raise_for_status()
+                
+                # Server-Sent Events: each "data:" line carries a JSON chunk of the generation
+                for line in response.iter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    chunk = json.loads(line[len("data:"):])
+                    text = chunk.get("results", [{}])[0].get("generated_text", "")
+                    if text:
+                        yield text
+            
+        except Exception as e:
+            logger.error(f"Error streaming from IBM watsonx.ai: {e}")
+            raise
 
 class RelativityRAGPipelineIBM:
     """RAG pipeline for Relativity release notes using IBM watsonx.ai."""
     
     def __init__(self, 
-                 embedding_model: str = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+                 embedding_model: str = EMBEDDING_MODEL,
                  llm_model: str = "meta-llama/llama-2-13b-chat",
                  chunk_size: int = 1000,
                  chunk_overlap: int = 150,
                  k_retrieval: int = 8,
-                 fetch_k: int = 40):
+                 fetch_k: int = 40,
+                 cache_similarity_threshold: float = 0.95,
+                 retrieval_profile: Optional[str] = None):
+        
+        # A named retrieval profile overrides fetch_k
+        if retrieval_profile is not None:
+            if retrieval_profile not in RETRIEVAL_PROFILES:
+                raise ValueError(f"Unknown retrieval profile: {retrieval_profile} (expected one of {', '.join(RETRIEVAL_PROFILES)})")
+            fetch_k = RETRIEVAL_PROFILES[retrieval_profile]
         
         self.embedding_model = embedding_model
         self.llm_model = llm_model
@@ -106,92 +387,53 @@ class RelativityRAGPipelineIBM:
         self.chunk_overlap = chunk_overlap
         self.k_retrieval = k_retrieval
         self.fetch_k = fetch_k
+        self.retrieval_profile = retrieval_profile
         
-        # Initialize components with multilingual embeddings
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name=embedding_model,
-            encode_kwargs={"normalize_embeddings": True}
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-        )
+        # Initialize components with multilingual embeddings (shared per process)
+        self.embeddings = get_embedder(embedding_model)
+        self.text_splitter = get_splitter(chunk_size, chunk_overlap)
         
         # Initialize IBM watsonx.ai LLM
         self.llm = IBMWatsonXLLM(model_name=llm_model)
         
+        # Exact cache for repeated questions, then semantic cache for paraphrases
+        self.exact_cache = QueryCache()
+        self.query_cache = SemanticQueryCache(similarity_threshold=cache_similarity_threshold)
+        
         # Vector store will be initialized when data is loaded
         self.vector_store = None
         self.qa_chain = None
         self.retriever = None
         
     def load_data_from_json(self, json_file: str) -> List[Document]:
-        """Load data from JSON file and convert to LangChain Documents."""
+        """Load data from a JSONL (or legacy JSON) file and convert to LangChain Documents."""
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            documents = []
-            for block in data:
-                # Combine content parts
-                content_parts = [
-                    block.get("title", ""),
-                    block.get("heading", ""),
-                    block.get("content", "")
-                ]
-                content = "\n".join([part for part in content_parts if part.strip()])
-                
-                if content.strip():
-                    # Create document with rich metadata
-                    doc = Document(
-                        page_content=content,
-                        metadata={
-                            "title": block.get("title", ""),
-                            "heading": block.get("heading", ""),
-                            "url": block.get("url", ""),
-                            "source": "relativity_release_notes"
-                        }
-                    )
-                    documents.append(doc)
-            
-            logger.info(f"Loaded {len(documents)} documents from {json_file}")
-            return documents
-            
+            return load_documents(json_file)
         except Exception as e:
             logger.error(f"Error loading data from {json_file}: {e}")
             return []
     
-    def create_vector_store(self, documents: List[Document], persist_directory: str = "./chroma_db"):
+    def create_vector_store(self, documents: List[Document], persist_directory: str = "./faiss_index",
+                            insert_batch_size: int = INSERT_BATCH_SIZE):
         """Create vector store from documents."""
         try:
-            # Split documents
-            split_docs = []
-            for doc in documents:
-                splits = self.text_splitter.split_documents([doc])
-                split_docs.extend(splits)
-            
-            # Create vector store
-            self.vector_store = Chroma.from_documents(
-                split_docs,
-                self.embeddings,
-                persist_directory=persist_directory
+            self.vector_store = index_documents(
+                documents, persist_directory, self.embeddings, self.text_splitter, insert_batch_size
             )
-            self.vector_store.persist()
-            
-            logger.info(f"Created vector store with {len(split_docs)} documents")
+            logger.info(f"Created vector store with {self.vector_store.index.ntotal} documents")
             return True
             
         except Exception as e:
             logger.error(f"Error creating vector store: {e}")
             return False
     
-    def load_existing_vector_store(self, persist_directory: str = "./chroma_db"):
+    def load_existing_vector_store(self, persist_directory: str = "./faiss_index"):
         """Load existing vector store."""
         try:
-            self.vector_store = Chroma(
-                persist_directory=persist_directory,
-                embedding_function=self.embeddings
+            self.vector_store = FAISS.load_local(
+                persist_directory,
+                self.embeddings,
+                distance_strategy=DistanceStrategy.MAX_INNER_PRODUCT
             )
             logger.info(f"Loaded existing vector store from {persist_directory}")
             return True
@@ -204,27 +446,16 @@ class RelativityRAGPipelineIBM:
         if not self.vector_store:
             raise ValueError("Vector store not initialized. Call create_vector_store() first.")
         
-        # Create base retriever with MMR
-        base_retriever = self.vector_store.as_retriever(
-            search_type="mmr",
-            search_kwargs={
-                "k": self.k_retrieval,
-                "fetch_k": self.fetch_k,
-                "lambda_mult": 0.5
-            }
-        )
-        
-        # Add contextual compression with embeddings filter
-        compressor = EmbeddingsFilter(
-            embeddings=self.embeddings,
+        # Create retriever with similarity threshold and MMR
+        self.retriever = FaissRetriever(
+            self.vector_store,
+            self.embeddings,
+            k=self.k_retrieval,
+            fetch_k=self.fetch_k,
+            lambda_mult=0.5,
             similarity_threshold=0.35
         )
         
-        self.retriever = ContextualCompressionRetriever(
-            base_compressor=compressor,
-            base_retriever=base_retriever
-        )
-        
         # Improved prompt template with explicit language instruction
         prompt_template = """You are a helpful assistant that answers questions about Relativity software releases based on the official release notes.
 
@@ -249,76 +480,220 @@ Answer:"""
             input_variables=["context", "question"]
         )
         
-        logger.info("QA chain created successfully with MMR retrieval and contextual compression")
+        logger.info("QA chain created successfully with thresholded FAISS MMR retrieval")
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Return exact-match cache statistics and the semantic cache size."""
+        return {**self.exact_cache.get_stats(), "semantic_size": len(self.query_cache)}
+    
+    def warmup(self, questions: List[str]) -> int:
+        """Precompute and cache query embeddings for known questions; returns how many were new."""
+        return self.embeddings.warmup(questions)
+    
+    def _insufficient_info_result(self, language: str) -> Dict[str, Any]:
+        """Build the result returned when no relevant documents are found."""
+        # Respond in the language of the question
+        if language == "es":
+            answer = "No tengo suficiente información para responder esa pregunta basándome en las notas de versión disponibles."
+        else:
+            answer = "I don't have enough information to answer that question based on the available release notes."
+        
+        return {
+            "answer": answer,
+            "citations": [],
+            "has_sufficient_info": False,
+            "needs_contact": True
+        }
+    
+    def _build_prompt(self, question: str, docs: List[Document]) -> str:
+        """Build the LLM prompt from the retrieved documents."""
+        context = "\n\n".join([doc.page_content for doc in docs])
+        return self.prompt.format(context=context, question=question)
+    
+    def _build_result(self, answer: str, docs: List[Document]) -> Dict[str, Any]:
+        """Build the query result with citations and the sufficient-information heuristic."""
+        # Extract citations from metadata
+        citations = []
+        for doc in docs:
+            if doc.metadata.get("url") and (doc.metadata.get("heading") or doc.metadata.get("title")):
+                citations.append({
+                    "url": doc.metadata["url"],
+                    "title": doc.metadata.get("title", ""),
+                    "heading": doc.metadata.get("heading", "")
+                })
+        
+        # Improved heurística for sufficient information
+        answer_length = len(answer.strip())
+        has_sufficient_info = (
+            len(docs) > 0 and 
+            answer_length >= 40 and
+            not answer.lstrip().lower().startswith(_INSUFFICIENT_INFO_PREFIXES)
+        )
+        
+        return {
+            "answer": answer,
+            "citations": citations,
+            "has_sufficient_info": has_sufficient_info,
+            "needs_contact": not has_sufficient_info
+        }
+    
+    def _error_result(self) -> Dict[str, Any]:
+        """Build the result returned when answering a question fails."""
+        return {
+            "answer": "I encountered an error while processing your question. Please try again.",
+            "citations": [],
+            "has_sufficient_info": False,
+            "needs_contact": True
+        }
+    
+    def _answer(self, question: str, language: str, question_embedding: List[float],
+                docs: List[Document]) -> Dict[str, Any]:
+        """Generate and cache the answer for a question from its retrieved documents."""
+        if not docs:
+            result = self._insufficient_info_result(language)
+        else:
+            # Generate answer using IBM watsonx.ai
+            prompt = self._build_prompt(question, docs)
+            answer = self.llm(prompt, temperature=0.0, max_tokens=1000)
+            result = self._build_result(answer, docs)
+        
+        self.query_cache.add(question_embedding, language, result)
+        self.exact_cache.put(question, result)
+        return result
+    
+    @staticmethod
+    def _truncate(result: Dict[str, Any], max_answer_chars: Optional[int]) -> Dict[str, Any]:
+        """Return the result with its answer cut to max_answer_chars; the cached result is left intact."""
+        if max_answer_chars is None or len(result["answer"]) <= max_answer_chars:
+            return result
+        return {**result, "answer": result["answer"][:max_answer_chars]}
+    
+    def query(self, question: str, max_answer_chars: Optional[int] = None) -> Dict[str, Any]:
+        """Query the RAG pipeline with improved logic.
+        
+        If max_answer_chars is given, the returned answer is truncated to that many characters.
+        """
+        try:
+            if not self.retriever:
+                raise ValueError("QA chain not initialized. Call create_qa_chain() first.")
+            
+            # Serve exact repeats without embedding the question
+            cached = self.exact_cache.get(question)
+            if cached is not None:
+                return self._truncate(cached, max_answer_chars)
+            
+            # Serve paraphrased questions from the semantic cache
+            language = detect_language(question)
+            question_embedding = self.embeddings.embed_query(question)
+            cached = self.query_cache.lookup(question_embedding, language)
+            if cached is not None:
+                self.exact_cache.put(question, cached)
+                return self._truncate(cached, max_answer_chars)
+            
+            # Retrieve relevant documents, reusing the question embedding
+            docs = self.retriever.get_relevant_documents_by_vector(question_embedding)
+            return self._truncate(self._answer(question, language, question_embedding, docs), max_answer_chars)
+            
+        except Exception as e:
+            logger.error(f"Error querying RAG pipeline: {e}")
+            return self._error_result()
     
-    def query(self, question: str) -> Dict[str, Any]:
-        """Query the RAG pipeline with improved logic."""
+    def query_batch(self, questions: List[str], max_workers: int = 4) -> List[Dict[str, Any]]:
+        """Answer several questions, returning results in the same order.
+        
+        Uncached questions are embedded in one call and retrieved with one index search;
+        their LLM calls then run concurrently on up to max_workers threads.
+        """
         try:
             if not self.retriever:
                 raise ValueError("QA chain not initialized. Call create_qa_chain() first.")
             
-            # Retrieve relevant documents
-            docs = self.retriever.get_relevant_documents(question)
+            results: List[Optional[Dict[str, Any]]] = [self.exact_cache.get(question) for question in questions]
+            pending = [i for i, result in enumerate(results) if result is None]
+            if not pending:
+                return results
             
-            if not docs:
-                # Detect language and respond accordingly
-                is_spanish = any(word in question.lower() for word in ['qué', 'cuáles', 'cómo', 'dónde', 'cuándo', 'por qué', 'háblame', 'dime', 'explica', 'describe'])
-                
-                if is_spanish:
-                    answer = "No tengo suficiente información para responder esa pregunta basándome en las notas de versión disponibles."
-                else:
-                    answer = "I don't have enough information to answer that question based on the available release notes."
-                
-                return {
-                    "answer": answer,
-                    "citations": [],
-                    "has_sufficient_info": False,
-                    "needs_contact": True
-                }
+            # Embed all uncached questions in a single forward pass
+            languages = {i: detect_language(questions[i]) for i in pending}
+            embeddings = dict(zip(pending, self.embeddings.embed_documents([questions[i] for i in pending])))
             
-            # Prepare context
-            context = "\n\n".join([doc.page_content for doc in docs])
+            for i in pending:
+                cached = self.query_cache.lookup(embeddings[i], languages[i])
+                if cached is not None:
+                    self.exact_cache.put(questions[i], cached)
+                    results[i] = cached
+            pending = [i for i in pending if results[i] is None]
+            if not pending:
+                return results
             
-            # Create prompt
-            prompt = self.prompt.format(context=context, question=question)
+            # One batched index search for the remaining questions
+            docs = dict(zip(pending, self.retriever.get_relevant_documents_by_vectors([embeddings[i] for i in pending])))
             
-            # Generate answer using IBM watsonx.ai
-            answer = self.llm(prompt, temperature=0.0, max_tokens=1000)
+            def answer(i: int) -> Dict[str, Any]:
+                try:
+                    return self._answer(questions[i], languages[i], embeddings[i], docs[i])
+                except Exception as e:
+                    logger.error(f"Error querying RAG pipeline: {e}")
+                    return self._error_result()
             
-            # Extract citations from metadata
-            citations = []
-            for doc in docs:
-                if doc.metadata.get("url") and (doc.metadata.get("heading") or doc.metadata.get("title")):
-                    citations.append({
-                        "url": doc.metadata["url"],
-                        "title": doc.metadata.get("title", ""),
-                        "heading": doc.metadata.get("heading", "")
-                    })
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for i, result in zip(pending, executor.map(answer, pending)):
+                    results[i] = result
+            return results
             
-            # Improved heurística for sufficient information
-            answer_length = len(answer.strip())
-            has_sufficient_info = (
-                len(docs) > 0 and 
-                answer_length >= 40 and
-                not answer.lower().startswith("i don't have enough information") and
-                not answer.lower().startswith("no tengo suficiente información")
-            )
+        except Exception as e:
+            logger.error(f"Error querying RAG pipeline batch: {e}")
+            return [self._error_result() for _ in questions]
+    
+    async def aquery(self, question: str, max_answer_chars: Optional[int] = None) -> Dict[str, Any]:
+        """Async variant of query(); the blocking work runs in a worker thread so calls can be gathered."""
+        return await asyncio.to_thread(self.query, question, max_answer_chars)
+    
+    def stream_query(self, question: str) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Query the RAG pipeline, streaming the answer.
+        
+        Yields ("token", {"text": ...}) events as the answer is generated, followed by a
+        ("done", {...}) event with the citations and flags, or an ("error", {...}) event.
+        """
+        try:
+            if not self.retriever:
+                raise ValueError("QA chain not initialized. Call create_qa_chain() first.")
             
-            return {
-                "answer": answer,
-                "citations": citations,
-                "has_sufficient_info": has_sufficient_info,
-                "needs_contact": not has_sufficient_info
-            }
+            # Serve exact repeats, then paraphrases, from the caches
+            result = self.exact_cache.get(question)
+            if result is None:
+                language = detect_language(question)
+                question_embedding = self.embeddings.embed_query(question)
+                result = self.query_cache.lookup(question_embedding, language)
+            
+            if result is None:
+                docs = self.retriever.get_relevant_documents_by_vector(question_embedding)
+                
+                if not docs:
+                    result = self._insufficient_info_result(language)
+                else:
+                    # Stream the answer from IBM watsonx.ai as it is generated
+                    prompt = self._build_prompt(question, docs)
+                    answer_parts = []
+                    for text in self.llm.stream(prompt, temperature=0.0, max_tokens=1000):
+                        answer_parts.append(text)
+                        yield "token", {"text": text}
+                    
+                    result = self._build_result("".join(answer_parts), docs)
+                    self.query_cache.add(question_embedding, language, result)
+                    self.exact_cache.put(question, result)
+                    yield "done", {key: value for key, value in result.items() if key != "answer"}
+                    return
+                
+                self.query_cache.add(question_embedding, language, result)
+            
+            self.exact_cache.put(question, result)
+            yield "token", {"text": result["answer"]}
+            yield "done", {key: value for key, value in result.items() if key != "answer"}
             
         except Exception as e:
-            logger.error(f"Error querying RAG pipeline: {e}")
-            return {
-                "answer": "I encountered an error while processing your question. Please try again.",
-                "citations": [],
-                "has_sufficient_info": False,
-                "needs_contact": True
-            }
+            logger.error(f"Error streaming RAG pipeline answer: {e}")
+            yield "error", {"error": "I encountered an error while processing your question. Please try again."}
     
     def create_rag_pipeline():
         """Convenience function to create RAG pipeline."""
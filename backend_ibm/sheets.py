@@ -5,23 +5,143 @@ Handles authentication, validation, and data logging.
 
 import os
 import re
+import time
+import queue
+import functools
+import random
+import atexit
 import datetime
-from typing import Dict, Any, Optional
+import threading
+from typing import Dict, Any, List, Optional, Tuple
 import gspread
+import requests
 from google.oauth2.service_account import Credentials
 from google.auth.exceptions import GoogleAuthError
 import logging
+from dotenv import load_dotenv
 
 logger = logging.getLogger(__name__)
 
+# Read .env once per process instead of on every logger construction
+if os.getenv("DOTENV_LOADED") != "1":
+    load_dotenv()
+    os.environ["DOTENV_LOADED"] = "1"
+
+# Queued rows are written by a background thread, up to MAX_BATCH rows per Sheets call
+MAX_BATCH = 50
+QUEUE_SIZE = 10_000
+MAX_BACKOFF = 60.0
+
+# A batch that still fails transiently after this many attempts is logged and dropped
+MAX_WRITE_ATTEMPTS = 8
+
+# Google Sheets rejects cells longer than this, so longer values are truncated before queueing
+MAX_CELL_CHARS = 50_000
+
+WORKSHEET_NAME = "Contact Submissions"
+HEADERS = (
+    "Timestamp",
+    "Name",
+    "Email",
+    "Organization",
+    "Original Question",
+    "Reason for Escalation",
+    "Status"
+)
+
+_UTC = datetime.timezone.utc
+
+# Sheets calls are throttled client-side and retried on rate-limit/transient errors
+REQUESTS_PER_SECOND = 10.0
+RETRY_STATUSES = (429, 500, 503)
+MAX_RETRIES = 6
+
+# setup_sheet is skipped while a marker written by a previous setup is younger than this
+SETUP_MARKER_DIR = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+    "relativity_chatbot"
+)
+SETUP_MARKER_TTL = 24 * 3600
+
+# Last row of an A1 range such as "'Contact Submissions'!A12:G13"
+_RANGE_END_RE = re.compile(r'(\d+)$')
+
+# Basic email validation regex (\Z so a trailing newline is not accepted)
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+
+class _TokenBucket:
+    """Thread-safe token bucket that blocks until a request may be sent."""
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Take one token, sleeping until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+_rate_limiter = _TokenBucket(REQUESTS_PER_SECOND, REQUESTS_PER_SECOND)
+
+def _is_transient(error: Exception) -> bool:
+    """Return whether a failed Sheets write is worth retrying later."""
+    if isinstance(error, gspread.exceptions.APIError):
+        return error.response.status_code in RETRY_STATUSES
+    return isinstance(error, (ConnectionError, requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+def _cell(value: Any) -> str:
+    """Convert a value to a sheet cell, truncated to the Sheets per-cell limit."""
+    value = "" if value is None else str(value)
+    return value[:MAX_CELL_CHARS]
+
+def _retry(fn, *args, **kwargs):
+    """Call a Sheets API function, backing off on 429/500/503 and honoring Retry-After."""
+    for attempt in range(MAX_RETRIES):
+        _rate_limiter.acquire()
+        try:
+            return fn(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            if e.response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES - 1:
+                raise
+            retry_after = e.response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                delay = float(retry_after)
+            else:
+                delay = min(MAX_BACKOFF, 2 ** attempt) + random.random()
+            logger.warning(f"Sheets API returned {e.response.status_code}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
 class GoogleSheetsLogger:
     """Handles logging contact information to Google Sheets."""
     
     def __init__(self, credentials_path=None, sheet_id=None):
-        from dotenv import load_dotenv; load_dotenv()
         self.credentials_path = credentials_path or os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH")
         self.sheet_id = sheet_id or os.getenv("GOOGLE_SHEET_ID")
         assert self.credentials_path and self.sheet_id, "Faltan credenciales/ID de hoja"
+        self.client = None
+        self.sheet = None
+        self.worksheet = None
+        self._last_row = None
+        self._headers_ok = set()
+        
+        # Rows waiting to be appended to the sheet, drained by a daemon thread
+        self._queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self._write_lock = threading.RLock()
+        # Rows the worker has taken off the queue but not yet written, keyed by id(row)
+        self._pending: Dict[int, List[str]] = {}
+        threading.Thread(target=self._worker, name="sheets-writer", daemon=True).start()
+        atexit.register(self.flush)
         
     def authenticate(self) -> bool:
         """Authenticate with Google Sheets API."""
@@ -43,6 +163,8 @@ class GoogleSheetsLogger:
             
             # Open the spreadsheet
             self.sheet = self.client.open_by_key(self.sheet_id)
+            self.worksheet = None
+            self._last_row = None
             
             logger.info("Successfully authenticated with Google Sheets")
             return True
@@ -54,51 +176,85 @@ class GoogleSheetsLogger:
             logger.error(f"Error authenticating with Google Sheets: {e}")
             return False
     
-    def setup_sheet(self, worksheet_name: str = "Contact Submissions") -> bool:
+    def setup_sheet(self, worksheet_name: str = WORKSHEET_NAME) -> bool:
         """Setup the worksheet with headers if it doesn't exist."""
+        # Headers already verified by this process
+        if worksheet_name in self._headers_ok:
+            return True
+        
+        marker = os.path.join(SETUP_MARKER_DIR, f"sheet_initialized_{self.sheet_id}_{worksheet_name}")
+        try:
+            if time.time() - os.path.getmtime(marker) < SETUP_MARKER_TTL:
+                logger.info(f"Worksheet {worksheet_name} already set up, skipping header check")
+                self._headers_ok.add(worksheet_name)
+                return True
+        except OSError:
+            pass
+        
         try:
             # Try to get existing worksheet
             try:
-                worksheet = self.sheet.worksheet(worksheet_name)
+                worksheet = _retry(self.sheet.worksheet, worksheet_name)
             except gspread.WorksheetNotFound:
                 # Create new worksheet
-                worksheet = self.sheet.add_worksheet(
+                worksheet = _retry(
+                    self.sheet.add_worksheet,
                     title=worksheet_name,
                     rows=1000,
                     cols=10
                 )
             
             # Check if headers exist
-            headers = worksheet.row_values(1)
-            expected_headers = [
-                "Timestamp",
-                "Name",
-                "Email",
-                "Organization", 
-                "Original Question",
-                "Reason for Escalation",
-                "Status"
-            ]
+            headers = _retry(worksheet.row_values, 1)
             
-            if not headers or headers != expected_headers:
+            if tuple(headers) != HEADERS:
                 # Set headers
-                worksheet.update('A1:G1', [expected_headers])
+                _retry(worksheet.update, 'A1:G1', [list(HEADERS)])
                 logger.info(f"Set up headers in worksheet: {worksheet_name}")
             
+            if worksheet_name == WORKSHEET_NAME:
+                self.worksheet = worksheet
+            self._headers_ok.add(worksheet_name)
+            
+            # Remember the setup so the next process start skips the header round trip
+            try:
+                os.makedirs(SETUP_MARKER_DIR, exist_ok=True)
+                with open(marker, "w") as f:
+                    f.write(datetime.datetime.now(_UTC).isoformat(timespec='milliseconds'))
+            except OSError as e:
+                logger.warning(f"Could not write setup marker {marker}: {e}")
+            
             return True
             
         except Exception as e:
             logger.error(f"Error setting up worksheet: {e}")
             return False
     
+    def _get_worksheet(self):
+        """Return the cached contact worksheet, resolving it on first use."""
+        if self.worksheet is None:
+            self.worksheet = _retry(self.sheet.worksheet, WORKSHEET_NAME)
+        return self.worksheet
+    
+    def _get_last_row(self) -> int:
+        """Return the last used row, reading column A only the first time."""
+        if self._last_row is None:
+            self._last_row = len(self._with_worksheet(lambda worksheet: worksheet.col_values(1)))
+        return self._last_row
+    
+    def _with_worksheet(self, operation):
+        """Run operation(worksheet) with retries, re-resolving a stale handle once on a 404."""
+        try:
+            return _retry(operation, self._get_worksheet())
+        except gspread.exceptions.APIError as e:
+            if e.response.status_code != 404:
+                raise
+            self.worksheet = None
+            return _retry(operation, self._get_worksheet())
+    
     def validate_email(self, email: str) -> bool:
         """Validate email format."""
-        if not email:
-            return False
-        
-        # Basic email validation regex
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+        return bool(email) and _EMAIL_RE.match(email) is not None
     
     def validate_contact_info(self, name: str, email: str, organization: str) -> Dict[str, Any]:
         """Validate contact information and return validation result."""
@@ -129,10 +285,6 @@ class GoogleSheetsLogger:
                    status: str = "New") -> Dict[str, Any]:
         """Log contact information to Google Sheets."""
         
-        if not self.client or not self.sheet:
-            if not self.authenticate():
-                return {"success": False, "error": "Authentication failed"}
-        
         # Validate contact information
         validation = self.validate_contact_info(name, email, organization)
         if not validation["is_valid"]:
@@ -142,39 +294,134 @@ class GoogleSheetsLogger:
                 "validation_errors": validation["errors"]
             }
         
+        # Prepare row data
+        timestamp = datetime.datetime.now(_UTC).isoformat(timespec='milliseconds')
+        row_data = [_cell(value) for value in (
+            timestamp,
+            name.strip(),
+            email.strip(),
+            organization.strip(),
+            original_question,
+            reason,
+            status
+        )]
+        
+        # Queue the row; the background writer appends it off the request path
         try:
-            # Get the worksheet
-            worksheet = self.sheet.worksheet("Contact Submissions")
-            
-            # Prepare row data
-            timestamp = datetime.datetime.utcnow().isoformat()
-            row_data = [
-                timestamp,
-                name.strip(),
-                email.strip(),
-                organization.strip(),
-                original_question,
-                reason,
-                status
-            ]
-            
-            # Append row to worksheet
-            worksheet.append_row(row_data)
+            self._queue.put_nowait(row_data)
+        except queue.Full:
+            logger.error(f"Contact queue is full, dropping submission for {email}")
+            return {"success": False, "error": "Contact queue is full"}
+        
+        logger.info(f"Queued contact for {email}")
+        
+        return {
+            "success": True,
+            "timestamp": timestamp,
+            "queued": True
+        }
+    
+    def _drain(self, batch: List[List[str]]) -> List[List[str]]:
+        """Move queued rows into batch without blocking, up to MAX_BATCH rows."""
+        while len(batch) < MAX_BATCH:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _worker(self):
+        """Append queued rows in batches, backing off exponentially while Sheets fails transiently."""
+        while True:
+            row = self._queue.get()
+            with self._write_lock:
+                batch = self._drain([row])
+                self._pending.update((id(item), item) for item in batch)
+            try:
+                self._write_batch(batch, write=self._write_pending)
+            finally:
+                with self._write_lock:
+                    for row in batch:
+                        self._pending.pop(id(row), None)
+    
+    def _write_pending(self, rows: List[List[str]]):
+        """Write the worker's rows that flush() has not claimed, then mark them written."""
+        with self._write_lock:
+            rows = [row for row in rows if id(row) in self._pending]
+            if not rows:
+                return
+            self._write_rows(rows)
+            for row in rows:
+                del self._pending[id(row)]
+    
+    def _write_batch(self, rows: List[List[str]], attempts: int = MAX_WRITE_ATTEMPTS, write=None) -> int:
+        """Write rows, retrying transient failures up to attempts times, and return how many were written.
+        
+        Rows that cannot be written are logged and dropped so they do not block later submissions.
+        A batch rejected permanently is retried row by row so one bad row only drops itself.
+        """
+        write = write or self._write_rows
+        delay = 1.0
+        for attempt in range(attempts):
+            try:
+                write(rows)
+                return len(rows)
+            except Exception as e:
+                if not _is_transient(e):
+                    if len(rows) > 1:
+                        logger.warning(f"Sheets rejected a batch of {len(rows)} contacts ({e}), retrying row by row")
+                        return sum(self._write_batch([row], attempts, write) for row in rows)
+                    self._drop_rows(rows, e)
+                    return 0
+                if attempt == attempts - 1:
+                    self._drop_rows(rows, e)
+                    return 0
+                logger.warning(f"Error logging contacts to Google Sheets ({e}), retrying in {delay:.0f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_BACKOFF)
+        return 0
+    
+    def _drop_rows(self, rows: List[List[str]], error: Exception):
+        """Log rows that could not be written so they can be re-entered by hand."""
+        for row in rows:
+            logger.error(f"Dropping contact row that could not be written to Google Sheets ({error}): {row}")
+    
+    def _write_rows(self, rows: List[List[str]]):
+        """Append rows to the sheet in one call, raising if the write fails."""
+        with self._write_lock:
+            if not self.client or not self.sheet:
+                if not self.authenticate():
+                    raise ConnectionError("Authentication with Google Sheets failed")
             
-            logger.info(f"Successfully logged contact for {email}")
+            response = self._with_worksheet(lambda worksheet: worksheet.append_rows(
+                rows, value_input_option='RAW', insert_data_option='INSERT_ROWS'
+            ))
             
-            return {
-                "success": True,
-                "timestamp": timestamp,
-                "row_added": True
-            }
+            # Track the last row so recent submissions can be read by range
+            updated_range = (response or {}).get("updates", {}).get("updatedRange", "")
+            match = _RANGE_END_RE.search(updated_range)
+            self._last_row = int(match.group(1)) if match else None
             
-        except Exception as e:
-            logger.error(f"Error logging contact to Google Sheets: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            logger.info(f"Successfully logged {len(rows)} contacts to Google Sheets")
+    
+    def flush(self) -> int:
+        """Synchronously write every queued row (used on shutdown) and return how many were written.
+        
+        Rows the worker is still retrying are claimed too, so an outage at shutdown logs them
+        instead of losing them; the worker skips claimed rows on its next attempt.
+        """
+        with self._write_lock:
+            claimed = list(self._pending.values())
+            self._pending.clear()
+        
+        written = 0
+        while True:
+            batch = self._drain(claimed)
+            claimed = []
+            if not batch:
+                return written
+            # Shutdown should not wait on backoff; unwritten rows are logged by _write_batch
+            written += self._write_batch(batch, attempts=1)
     
     def get_recent_submissions(self, limit: int = 10) -> Dict[str, Any]:
         """Get recent contact submissions from the sheet."""
@@ -183,25 +430,22 @@ class GoogleSheetsLogger:
                 if not self.authenticate():
                     return {"success": False, "error": "Authentication failed"}
             
-            worksheet = self.sheet.worksheet("Contact Submissions")
+            # Rows are appended in timestamp order, so the newest ones are at the bottom.
+            # The range is open-ended so rows appended by other processes are still picked up.
+            first_row = max(2, self._get_last_row() - limit + 1)
+            rows = self._with_worksheet(lambda worksheet: worksheet.get(f"A{first_row}:G"))
+            last_row = first_row + len(rows) - 1
+            self._last_row = max(last_row, 1)
             
-            # Get all data
-            all_data = worksheet.get_all_records()
-            
-            # Sort by timestamp (assuming first column is timestamp)
-            sorted_data = sorted(
-                all_data, 
-                key=lambda x: x.get('Timestamp', ''), 
-                reverse=True
-            )
-            
-            # Return limited results
-            recent_data = sorted_data[:limit]
+            recent_data = [
+                dict(zip(HEADERS, list(row) + [""] * (len(HEADERS) - len(row))))
+                for row in reversed(rows[-limit:])
+            ] if limit > 0 else []
             
             return {
                 "success": True,
                 "submissions": recent_data,
-                "total_count": len(all_data)
+                "total_count": max(0, last_row - 1)
             }
             
         except Exception as e:
@@ -213,17 +457,24 @@ class GoogleSheetsLogger:
     
     def update_submission_status(self, row_number: int, status: str) -> Dict[str, Any]:
         """Update the status of a submission."""
+        return self.update_submission_statuses([(row_number, status)])
+    
+    def update_submission_statuses(self, updates: List[Tuple[int, str]]) -> Dict[str, Any]:
+        """Update the status of several submissions in a single batchUpdate call."""
         try:
             if not self.client or not self.sheet:
                 if not self.authenticate():
                     return {"success": False, "error": "Authentication failed"}
             
-            worksheet = self.sheet.worksheet("Contact Submissions")
-            
-            # Update status in column G (7th column)
-            worksheet.update(f'G{row_number}', status)
+            # Status lives in column G (7th column)
+            data = [
+                {"range": f"'{WORKSHEET_NAME}'!G{row_number}", "values": [[status]]}
+                for row_number, status in updates
+            ]
+            if data:
+                _retry(self.sheet.values_batch_update, {"valueInputOption": "RAW", "data": data})
             
-            return {"success": True, "status_updated": True}
+            return {"success": True, "status_updated": True, "updated_count": len(data)}
             
         except Exception as e:
             logger.error(f"Error updating submission status: {e}")
@@ -257,6 +508,17 @@ def create_sheets_logger(credentials_path: Optional[str] = None,
     
     return logger
 
+_init_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=1)
+def _get_logger() -> GoogleSheetsLogger:
+    return create_sheets_logger()
+
+def get_logger() -> GoogleSheetsLogger:
+    """Return the process-wide authenticated logger, creating it on first use."""
+    with _init_lock:
+        return _get_logger()
+
 if __name__ == "__main__":
     # Test the Google Sheets integration
     import os
@@ -279,6 +541,9 @@ if __name__ == "__main__":
         print(f"Log result: {result}")
         
         if result["success"]:
+            # Write the queued row before reading it back
+            logger.flush()
+            
             # Get recent submissions
             submissions = logger.get_recent_submissions(5)
             print(f"Recent submissions: {submissions}")
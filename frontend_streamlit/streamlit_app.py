@@ -5,13 +5,38 @@ Reemplaza el frontend Gradio con una interfaz más simple y robusta.
 
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import os
+import re
 from datetime import datetime
-import json
+import orjson
+import html
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:5000")
 
+# Request bodies are serialized with orjson instead of requests' stdlib json
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Identical prompts are answered from a process-wide cache for a few minutes
+ANSWER_CACHE_SIZE = 128
+ANSWER_CACHE_TTL = 600
+
+# Speculatively ask the backend for a "tell me more" follow-up while the user reads an answer.
+# Off by default: every answer then costs a second LLM call.
+PREFETCH_FOLLOWUPS = os.getenv("PREFETCH_FOLLOWUPS", "0") == "1"
+_FOLLOWUP_RE = re.compile(
+    r"^\s*(tell me more|more details?|give me an example|cu[eé]ntame m[aá]s|"
+    r"(dame )?m[aá]s detalles|dame un ejemplo)\W*$",
+    re.IGNORECASE
+)
+
 # Page config
 st.set_page_config(
     page_title="Relativity FAQ Chatbot",
@@ -61,76 +86,222 @@ if "contact_mode" not in st.session_state:
 if "current_question" not in st.session_state:
     st.session_state.current_question = ""
 
-def test_backend():
+@st.cache_resource
+def get_session():
+    """Return a pooled keep-alive HTTP session shared across reruns and users"""
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+@st.cache_resource
+def get_probe_session():
+    """Return a keep-alive session without retries, so health probes fail fast"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=2, max_retries=0)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def test_backend(url=API_BASE_URL):
     """Test backend connectivity"""
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
+        # No retries: a refused or unroutable backend is reported within the 0.5 s connect timeout
+        response = get_probe_session().get(f"{url}/health", timeout=(0.5, 5))
         if response.status_code == 200:
-            return True, response.json()
+            return True, orjson.loads(response.content)
         else:
             return False, f"Status: {response.status_code}"
     except Exception as e:
         return False, str(e)
 
-def send_message(message):
+@st.cache_data(ttl=30, show_spinner=False)
+def test_backend_cached(url):
+    """Test backend connectivity, reusing the result for 30 seconds"""
+    return test_backend(url)
+
+def send_message(message, session=None):
     """Send message to backend"""
     try:
-        response = requests.post(
+        response = (session or get_session()).post(
             f"{API_BASE_URL}/chatbot",
-            json={"question": message},
+            data=orjson.dumps({"question": message}),
+            headers=JSON_HEADERS,
             timeout=30
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
             return {"error": f"Backend error: {response.status_code}"}
     except Exception as e:
         return {"error": f"Connection error: {str(e)}"}
 
-def validate_contact(name, email, organization):
-    """Validate contact information"""
+def stream_message(message, result):
+    """Stream answer tokens from the backend; citations and flags (or an error) are stored in result"""
     try:
-        response = requests.post(
-            f"{API_BASE_URL}/validate_contact",
-            json={
-                "name": name,
-                "email": email,
-                "organization": organization
-            },
-            timeout=10
-        )
-        if response.status_code == 200:
-            return response.json()
-        else:
-            return {"valid": False, "error": f"Validation error: {response.status_code}"}
+        with get_session().post(
+            f"{API_BASE_URL}/chatbot/stream",
+            data=orjson.dumps({"question": message}),
+            headers={**JSON_HEADERS, "Accept": "text/event-stream"},
+            stream=True,
+            timeout=(5, 60)
+        ) as response:
+            if response.status_code != 200:
+                result["error"] = f"Backend error: {response.status_code}"
+                return
+            
+            # Parse Server-Sent Events as the bytes arrive
+            response.encoding = "utf-8"
+            event = None
+            buffer = ""
+            for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+                buffer += chunk
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    if line.startswith("event:"):
+                        event = line[len("event:"):].strip()
+                    elif line.startswith("data:"):
+                        data = orjson.loads(line[len("data:"):])
+                        if event == "token":
+                            yield data.get("text", "")
+                        else:
+                            result.update(data)
     except Exception as e:
-        return {"valid": False, "error": f"Connection error: {str(e)}"}
+        result["error"] = f"Connection error: {str(e)}"
+
+@st.cache_resource
+def get_prefetch_executor():
+    """Return the shared worker pool for speculative follow-up requests"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def start_prefetch(answer):
+    """Request the likely follow-up answer in the background while the user reads"""
+    if PREFETCH_FOLLOWUPS and answer:
+        st.session_state.prefetched = get_prefetch_executor().submit(
+            send_message, f"More detail on: {answer[:200]}", get_session()
+        )
+
+def take_prefetched(prompt):
+    """Return the prefetched answer if prompt is a generic follow-up, discarding it otherwise"""
+    future = st.session_state.pop("prefetched", None)
+    if future is None:
+        return None
+    if _FOLLOWUP_RE.match(prompt):
+        return future.result()
+    future.cancel()
+    return None
+
+class AnswerCache:
+    """Thread-safe LRU+TTL cache of backend answers keyed by a short hash of the prompt"""
+    
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _key(prompt):
+        return hashlib.blake2b(prompt.strip().encode("utf-8"), digest_size=8).hexdigest()
+    
+    def get(self, prompt):
+        """Return the cached result for prompt, or None"""
+        key = self._key(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return orjson.loads(entry[1])
+    
+    def put(self, prompt, result):
+        """Store a result (as raw JSON bytes) for prompt"""
+        key = self._key(prompt)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, orjson.dumps(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+@st.cache_resource
+def get_answer_cache():
+    """Return the answer cache shared by every session in this process"""
+    return AnswerCache(ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL)
+
+# Same rules as the backend's validate_contact_info, checked before any network call
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}\Z')
+
+def validate_contact(name, email, organization):
+    """Validate contact information locally"""
+    errors = []
+    if not name or not name.strip():
+        errors.append("Name is required")
+    if not email or not email.strip():
+        errors.append("Email is required")
+    elif not _EMAIL_RE.match(email.strip()):
+        errors.append("Invalid email format")
+    if not organization or not organization.strip():
+        errors.append("Organization is required")
+    return {"valid": not errors, "error": "; ".join(errors)}
 
 def submit_contact(name, email, organization, question):
     """Submit contact information"""
     try:
-        response = requests.post(
+        response = get_session().post(
             f"{API_BASE_URL}/collect_contact",
-            json={
+            data=orjson.dumps({
                 "name": name,
                 "email": email,
                 "organization": organization,
-                "question": question,
+                "original_question": question,
                 "timestamp": datetime.now().isoformat()
-            },
+            }),
+            headers=JSON_HEADERS,
             timeout=10
         )
         if response.status_code == 200:
-            return response.json()
+            return orjson.loads(response.content)
         else:
-            return {"success": False, "error": f"Submission error: {response.status_code}"}
+            # The backend revalidates and explains rejected submissions
+            try:
+                error = orjson.loads(response.content).get("error")
+            except ValueError:
+                error = None
+            return {"success": False, "error": error or f"Submission error: {response.status_code}"}
     except Exception as e:
         return {"success": False, "error": f"Connection error: {str(e)}"}
 
-# Sidebar
-with st.sidebar:
-    st.title("🔧 Configuración")
-    
+def _uniq_citations(citations):
+    """Drop repeated sources, keeping the first occurrence of each (url, title)"""
+    unique = {}
+    for citation in citations:
+        unique.setdefault((citation.get("url"), citation.get("title")), citation)
+    return list(unique.values())
+
+@st.cache_data(max_entries=128, show_spinner=False)
+def format_citations(sources):
+    """Build the sources block for a tuple of (title, url) pairs, cached across reruns"""
+    items = "".join(
+        f'<div class="citation">📄 {html.escape(title or "Sin título")} - '
+        f'<a href="{html.escape(url or "#")}" target="_blank">'
+        f'{html.escape(url or "Sin URL")}</a></div>'
+        for title, url in sources
+    )
+    return f"**📚 Fuentes:**\n\n{items}"
+
+def render_citations(citations):
+    """Render the sources block for an answer with a single st.markdown call"""
+    sources = tuple((citation.get("title"), citation.get("url")) for citation in _uniq_citations(citations))
+    st.markdown(format_citations(sources), unsafe_allow_html=True)
+
+@st.fragment
+def render_backend_panel():
+    """Backend URL and connectivity test, without rerunning the chat history"""
     # Backend URL configuration
     st.subheader("Backend URL")
     backend_url = st.text_input(
@@ -139,10 +310,15 @@ with st.sidebar:
         help="URL del backend IBM (ej: https://your-app.us-south.codeengine.appdomain.cloud)"
     )
     
+    # Forget cached health checks when the URL changes
+    if st.session_state.get("health_url") != backend_url:
+        test_backend_cached.clear()
+        st.session_state.health_url = backend_url
+    
     # Test backend button
     if st.button("🧪 Probar Backend"):
         with st.spinner("Probando conexión..."):
-            success, result = test_backend()
+            success, result = test_backend_cached(backend_url)
             if success:
                 st.success("✅ Backend conectado")
                 st.json(result)
@@ -154,27 +330,29 @@ with st.sidebar:
     st.write(f"**API URL:** {backend_url}")
     st.write(f"**Modo contacto:** {st.session_state.contact_mode}")
 
-# Main content
-st.title("🤖 Relativity FAQ Chatbot")
-st.markdown("Pregunta sobre las notas de versión de Relativity. Si no encuentro información suficiente, te pediré tus datos de contacto.")
-
-# Chat interface
-if not st.session_state.contact_mode:
-    # Display chat history
+@st.fragment
+def render_chat_history():
+    """Display the chat history; fragment reruns elsewhere on the page do not replay it"""
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.write(message["content"])
             
             # Display citations if available
             if "citations" in message and message["citations"]:
-                st.markdown("**📚 Fuentes:**")
-                for citation in message["citations"]:
-                    st.markdown(f"""
-                    <div class="citation">
-                        📄 {citation.get('title', 'Sin título')} - 
-                        <a href="{citation.get('url', '#')}" target="_blank">{citation.get('url', 'Sin URL')}</a>
-                    </div>
-                    """, unsafe_allow_html=True)
+                render_citations(message["citations"])
+
+# Sidebar
+with st.sidebar:
+    st.title("🔧 Configuración")
+    render_backend_panel()
+
+# Main content
+st.title("🤖 Relativity FAQ Chatbot")
+st.markdown("Pregunta sobre las notas de versión de Relativity. Si no encuentro información suficiente, te pediré tus datos de contacto.")
+
+# Chat interface
+if not st.session_state.contact_mode:
+    render_chat_history()
     
     # Chat input
     if prompt := st.chat_input("Escribe tu pregunta aquí..."):
@@ -185,46 +363,54 @@ if not st.session_state.contact_mode:
         with st.chat_message("user"):
             st.write(prompt)
         
-        # Get bot response
+        # Get bot response, rendering tokens as they arrive
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Pensando..."):
-                result = send_message(prompt)
-                
-                if "error" in result:
-                    st.error(f"Error: {result['error']}")
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": f"❌ Error: {result['error']}"
-                    })
-                else:
-                    answer = result.get("answer", "No se pudo generar una respuesta.")
+            result = take_prefetched(prompt)
+            if result is None:
+                result = get_answer_cache().get(prompt)
+            
+            if result is not None:
+                answer = result.get("answer", "")
+                if "error" not in result and answer:
                     st.write(answer)
-                    
-                    # Display citations
-                    citations = result.get("citations", [])
-                    if citations:
-                        st.markdown("**📚 Fuentes:**")
-                        for citation in citations:
-                            st.markdown(f"""
-                            <div class="citation">
-                                📄 {citation.get('title', 'Sin título')} - 
-                                <a href="{citation.get('url', '#')}" target="_blank">{citation.get('url', 'Sin URL')}</a>
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    # Add bot message to history
-                    st.session_state.messages.append({
-                        "role": "assistant", 
-                        "content": answer,
-                        "citations": citations
-                    })
-                    
-                    # Check if contact is needed
-                    if result.get("needs_contact", False):
-                        st.session_state.contact_mode = True
-                        st.session_state.current_question = prompt
-                        st.warning("⚠️ Para responder mejor a tu pregunta, necesitamos más información.")
-                        st.rerun()
+            else:
+                result = {}
+                with st.spinner("🤔 Pensando..."):
+                    answer = st.write_stream(stream_message(prompt, result))
+                if "error" not in result and answer:
+                    get_answer_cache().put(prompt, {"answer": answer, **result})
+            
+            if "error" in result:
+                st.error(f"Error: {result['error']}")
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": f"❌ Error: {result['error']}"
+                })
+            else:
+                if not answer:
+                    answer = "No se pudo generar una respuesta."
+                    st.write(answer)
+                
+                # Display citations
+                citations = result.get("citations", [])
+                if citations:
+                    render_citations(citations)
+                
+                # Add bot message to history
+                st.session_state.messages.append({
+                    "role": "assistant", 
+                    "content": answer,
+                    "citations": citations
+                })
+                
+                # Check if contact is needed
+                if result.get("needs_contact", False):
+                    st.session_state.contact_mode = True
+                    st.session_state.current_question = prompt
+                    st.warning("⚠️ Para responder mejor a tu pregunta, necesitamos más información.")
+                    st.rerun()
+                
+                start_prefetch(answer)
 
 # Contact form
 if st.session_state.contact_mode:
@@ -249,11 +435,11 @@ if st.session_state.contact_mode:
             if not name or not email or not organization:
                 st.error("❌ Por favor completa todos los campos obligatorios.")
             else:
-                # Validate contact info
+                # Validate locally; the backend revalidates on submission
                 validation = validate_contact(name, email, organization)
                 
                 if validation.get("valid", False):
-                    # Submit contact info
+                    # Submit contact info in a single request
                     submission = submit_contact(
                         name, email, organization, 
                         st.session_state.current_question